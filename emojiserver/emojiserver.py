@@ -3,104 +3,289 @@ This program spawns an HTTP server that serves relevant emojis based on the
 request path.
 """
 
+import argparse
+import io
 import json
+import queue
+import socket
+import threading
+import time
+import traceback
+from collections import Counter
 from http.server import BaseHTTPRequestHandler, HTTPServer
 from urllib.parse import parse_qs, urlparse
 
-import numpy as np
-
-import emojilib
 import word2vec
+from engine import EmojiEngine, NUM_EMOJIS
+
+MAX_NUMBER = 100 # Most emojis a single request may ask for
+
+NUM_WORKERS = 4 # Threads that handle requests
+QUEUE_SIZE = 32 # Connections that may wait for a worker before getting a 503
+REQUEST_TIMEOUT = 5.0 # Seconds a request has from being accepted to being answered
+WRITE_TIMEOUT = 1.0 # Seconds a worker may spend sending a response
+
+UNAVAILABLE = (b'HTTP/1.0 503 Service Unavailable\r\n'
+               b'Content-Length: 0\r\n'
+               b'Retry-After: 1\r\n'
+               b'Connection: close\r\n\r\n')
+
+ENGINE = None # Created by `start()`
+
+READY = threading.Event() # Set once everything is loaded and warmed up
+STARTERROR = None # The exception that stopped a background start, if any
 
-NUM_EMOJIS = 10 # Number of emojis to print
-CATEGORY_LENGTH = 8 # Disregard categories with greater or equal to this many elements
-
-EMOJIS = emojilib.pared_emojis()
-WORDCORPUS = emojilib.emojicorpus(EMOJIS)
-MODEL = word2vec.normedmodel(WORDCORPUS)
-
-CORPUSMAP = emojilib.emojicorpusmap(EMOJIS, MODEL.vocab)
-WCL = list(CORPUSMAP.items())
-VECTORCORPUS = word2vec.vectorcorpus(MODEL, WCL)
-
-def similar(word, num):
-    """Return the n matching emojis for a word."""
-    dotprod = np.dot(VECTORCORPUS, MODEL.word_vec(word))
-
-    # Find the matches with the most similarity
-    matches = np.argpartition(dotprod, -num)[-num:]
-    sortedmatches = matches[np.argsort(dotprod[matches])][::-1]
-
-    # First find matching emojis that aren't in large categories
-    goodnames = []
-    goodcategories = []
-    nameset = set()
-    for index in sortedmatches:
-        names = WCL[index][1]
-        if len(names) < CATEGORY_LENGTH:
-            for name in names:
-                if name not in nameset:
-                    goodnames.append((name, float(dotprod[index])))
-                    nameset.add(name)
-        else:
-            goodcategories.append((names, dotprod[index]))
-
-    # If there aren't enough then start looking at categories
-    if len(goodnames) < NUM_EMOJIS:
-        goodcategories.sort(key=lambda x: len(x[0]))
-        for category, similarity in goodcategories:
-            for name in category:
-                if name not in nameset:
-                    goodnames.append((name, float(similarity)))
-                    nameset.add(name)
-                    if len(goodnames) == num:
-                        break
-            if len(goodnames) == num:
-                break
-
-    return goodnames[:num]
-
-def formatsimilar(names, emojis):
-    """Return the output of `similar` but with the emojis instead of their
-    names or the slack names.
+def start(dimensions=None):
+    """Load and warm up the engine, then mark the server as ready.
+
+    If dimensions is given, the model reduced to that many dimensions is used.
     """
-    ret = []
-    for name, similarity in names:
-        if emojis:
-            ret.append((EMOJIS[name]['char'], similarity))
-        else:
-            ret.append((EMOJIS[name]['name'], similarity))
-    return ret
+    global ENGINE
+    ENGINE = EmojiEngine(dimensions)
+    ENGINE.load()
+    ENGINE.warmup()
+    READY.set()
+    print('Server ready')
+
+def startinbackground(dimensions=None):
+    """Run `start()`, recording any error so health checks can report it."""
+    global STARTERROR
+    try:
+        start(dimensions)
+    except Exception as e:
+        STARTERROR = e
+        traceback.print_exc()
+
+def formatsimilar(ids, scores, emojis):
+    """Return the emojis and similarities from a query, with either the emoji
+    characters or their slack names.
+    """
+    key = 'char' if emojis else 'name'
+    return [(ENGINE.emojis[ENGINE.names[i]][key], float(similarity))
+            for i, similarity in zip(ids, scores)]
+
+def clampnumber(num, ceiling):
+    """Limit the number of requested emojis to the ceiling and corpus size."""
+    return max(1, min(num, ceiling, ENGINE.size))
+
+class QueuedHTTPServer(HTTPServer):
+    """An HTTP server that hands connections to a fixed pool of workers.
+
+    Connections that arrive while the queue is full are answered with a 503
+    straight away, and connections that are still waiting once their deadline
+    has passed get a 503 instead of being handled.
+    """
+
+    def __init__(self, server_address, handler, workers=NUM_WORKERS,
+                 queuesize=QUEUE_SIZE, requesttimeout=REQUEST_TIMEOUT,
+                 maxnumber=MAX_NUMBER):
+        super().__init__(server_address, handler)
+        self.requesttimeout = requesttimeout
+        self.maxnumber = maxnumber
+        self.requests = queue.Queue(queuesize)
+        self.stats = Counter()
+        self.statslock = threading.Lock()
+        for _ in range(workers):
+            threading.Thread(target=self.work, daemon=True).start()
+
+    def count(self, stat):
+        """Increment one of the server's counters."""
+        with self.statslock:
+            self.stats[stat] += 1
+
+    def statistics(self):
+        """Return the server's counters along with the current queue size."""
+        with self.statslock:
+            stats = dict(self.stats)
+        for stat in ('rejected', 'timedout'):
+            stats.setdefault(stat, 0)
+        stats['queued'] = self.requests.qsize()
+        return stats
+
+    def process_request(self, request, client_address):
+        """Queue the connection, or turn it away if the queue is full."""
+        deadline = time.monotonic() + self.requesttimeout
+        try:
+            self.requests.put_nowait((request, client_address, deadline))
+        except queue.Full:
+            self.count('rejected')
+            self.reject(request)
+
+    def work(self):
+        """Handle queued connections until the process exits."""
+        while True:
+            request, client_address, deadline = self.requests.get()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self.count('timedout')
+                self.reject(request)
+                continue
+
+            try:
+                self.finish_request(request, client_address, deadline)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    def finish_request(self, request, client_address, deadline=None):
+        """Handle a connection that has to be answered by the deadline."""
+        self.RequestHandlerClass(request, client_address, self, deadline)
+
+    def reject(self, request):
+        """Answer a connection with a 503 without parsing the request.
+
+        The socket is left non-blocking so a stuck client can't hold up the
+        thread accepting connections.
+        """
+        try:
+            request.setblocking(False)
+            # Drain what the client already sent so closing doesn't reset it
+            try:
+                request.recv(65536)
+            except OSError:
+                pass
+            request.send(UNAVAILABLE)
+        except OSError:
+            pass
+        self.shutdown_request(request)
+
+class DeadlineReader(io.RawIOBase):
+    """Reads from a socket, giving up once a deadline has passed.
+
+    The socket's timeout is lowered to the time left before every read, so a
+    client sending bytes slowly can't keep a worker past the deadline.
+    """
+
+    def __init__(self, sock, deadline):
+        super().__init__()
+        self.sock = sock
+        self.deadline = deadline
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        remaining = self.deadline - time.monotonic()
+        if remaining <= 0:
+            raise socket.timeout('timed out')
+        self.sock.settimeout(remaining)
+        return self.sock.recv_into(buffer)
 
 class EmojiRequestHandler(BaseHTTPRequestHandler):
     """A request handler the serves up emojis for words."""
 
+    def __init__(self, request, client_address, server, deadline=None):
+        if deadline is None:
+            deadline = time.monotonic() + REQUEST_TIMEOUT
+        self.deadline = deadline
+        super().__init__(request, client_address, server)
+
+    def setup(self):
+        """Read the request through a reader that enforces the deadline."""
+        super().setup()
+        self.rfile.close()
+        self.rfile = io.BufferedReader(DeadlineReader(self.connection, self.deadline))
+
     def do_GET(self):
         """Handle GET requests."""
+        # The request has been read, so all that's left is writing a response
+        self.connection.settimeout(WRITE_TIMEOUT)
+
         req = urlparse(self.path)
         query = parse_qs(req.query, keep_blank_values=True)
         word = req.path[1:]
+
+        if word == '_stats':
+            self.send_json(self.server.statistics())
+            return
+        if word == '_health':
+            healthy = STARTERROR is None
+            self.send_json(healthy, 200 if healthy else 503)
+            return
+        if word == '_ready' or not READY.is_set():
+            ready = READY.is_set()
+            self.send_json(ready, 200 if ready else 503)
+            return
+
         try:
             num = int(query['number'][0])
         except (ValueError, KeyError, IndexError):
             num = NUM_EMOJIS
+        num = clampnumber(num, self.server.maxnumber)
+
+        # Don't spend time on a query nobody is waiting for anymore
+        if time.monotonic() > self.deadline:
+            self.server.count('timedout')
+            self.send_response(503)
+            self.send_header('Content-Length', '0')
+            self.send_header('Retry-After', '1')
+            self.end_headers()
+            return
 
         try:
-            data = formatsimilar(similar(word, num), 'emojis' in query)
+            data = formatsimilar(*ENGINE.query(word, num), 'emojis' in query)
         except KeyError:
             data = None
 
-        self.send_response(200)
+        self.send_json(data)
+
+    def send_json(self, data, status=200):
+        """Send the data encoded as JSON."""
+        self.send_response(status)
         self.send_header('Content-Type', 'application/json; charset=utf-8')
         self.end_headers()
         self.wfile.write(json.dumps(data, ensure_ascii=False).encode('utf-8'))
 
+    def log_error(self, format, *args):
+        """Count requests that ran out of time instead of logging them."""
+        if format.startswith('Request timed out'):
+            self.server.count('timedout')
+
     def log_message(self, format, *args):
         """Don't log anything."""
         return
 
+def parseargs():
+    """Parse the command line options for the server."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=NUM_WORKERS,
+                        help='number of threads handling requests')
+    parser.add_argument('--queue-size', type=int, default=QUEUE_SIZE,
+                        help='connections that may wait before getting a 503')
+    parser.add_argument('--timeout', type=float, default=REQUEST_TIMEOUT,
+                        help='seconds a request has to be answered')
+    parser.add_argument('--max-number', type=int, default=MAX_NUMBER,
+                        help='most emojis a request may ask for')
+    parser.add_argument('--background', action='store_true',
+                        help='bind the port before loading the model')
+    parser.add_argument('--dimensions', type=int,
+                        help='score with the model reduced to this many dimensions')
+    args = parser.parse_args()
+    try:
+        word2vec.checkdimensions(args.dimensions)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.workers < 1:
+        parser.error('--workers must be at least 1')
+    if args.queue_size < 1:
+        parser.error('--queue-size must be at least 1')
+    if args.timeout <= 0:
+        parser.error('--timeout must be greater than 0')
+    return args
+
 if __name__ == '__main__':
+    args = parseargs()
+    if args.background:
+        threading.Thread(target=startinbackground, args=(args.dimensions,), daemon=True).start()
+    else:
+        start(args.dimensions)
+
     print('Starting server')
-    server_address = ('', 8000)
-    httpd = HTTPServer(server_address, EmojiRequestHandler)
+    server_address = ('', args.port)
+    httpd = QueuedHTTPServer(server_address, EmojiRequestHandler,
+                             workers=args.workers, queuesize=args.queue_size,
+                             requesttimeout=args.timeout,
+                             maxnumber=args.max_number)
     httpd.serve_forever()
@@ -0,0 +1,242 @@
+"""
+This module holds the engines that suggest emojis for words. An engine loads
+what it needs the first time it's queried, and returns the suggestions as
+arrays of emoji ids and similarities. The ids index into the engine's `names`.
+"""
+
+import abc
+import threading
+
+import numpy as np
+
+import emojilib
+import similarlist
+import word2vec
+
+NUM_EMOJIS = 10 # Default number of emojis; large categories are only used to reach this many
+CATEGORY_LENGTH = 8 # Disregard categories with greater or equal to this many elements
+
+WARMUP_WORDS = ['happy', 'sad', 'dog', 'pizza', 'love', 'car', 'sun', 'party']
+
+def checknum(num):
+    """Raise a ValueError if num isn't a number of emojis that can be asked for."""
+    if num < 1:
+        raise ValueError('num must be at least 1, not {}'.format(num))
+
+class Engine(abc.ABC):
+    """The base class for engines.
+
+    Subclasses fill in `emojis` and `names` in `loadartifacts()` and implement
+    `query()`. The emojis are loaded with the given function, which returns a
+    dict like the one from `emojilib.emojis()`.
+    """
+
+    def __init__(self, loademojis):
+        self.loademojis = loademojis
+        self.emojis = None
+        self.names = None
+        self.loaded = False
+        self.loadlock = threading.Lock()
+
+    def load(self):
+        """Load the engine's data if it hasn't been already."""
+        # Skip the lock once loaded so queries don't contend on it
+        if self.loaded:
+            return
+        with self.loadlock:
+            if not self.loaded:
+                self.loadartifacts()
+                self.loaded = True
+
+    @abc.abstractmethod
+    def loadartifacts(self):
+        """Load the engine's data."""
+
+    @abc.abstractmethod
+    def query(self, word, num):
+        """Return arrays of up to num emoji ids and their similarities to the
+        word, most similar first.
+
+        A KeyError is raised if the engine doesn't know the word, and a
+        ValueError if num is less than 1.
+        """
+
+    def batchquery(self, words, num):
+        """Return arrays of emoji ids and similarities for each of the words.
+
+        Both arrays have a row for each word and num columns. Rows with fewer
+        matches, or for unknown words, are padded with ids of -1 and
+        similarities of NaN. A ValueError is raised if num is less than 1.
+        """
+        checknum(num)
+        self.load()
+        ids = np.full((len(words), num), -1, dtype=np.intp)
+        scores = np.full((len(words), num), np.nan, dtype=np.float32)
+        for row, word in enumerate(words):
+            try:
+                wordids, wordscores = self.query(word, num)
+            except KeyError:
+                continue
+            ids[row, :len(wordids)] = wordids
+            scores[row, :len(wordids)] = wordscores
+        return ids, scores
+
+class EmojiEngine(Engine):
+    """Suggests the emojis whose names and keywords are closest to a word in
+    the limitted word2vec model.
+    """
+
+    def __init__(self, dimensions=None, loademojis=emojilib.pared_emojis):
+        """If dimensions is given, the model reduced to that many dimensions is
+        used for scoring.
+        """
+        super().__init__(loademojis)
+        self.dimensions = dimensions
+        self.model = None
+        self.corpus = None
+        self.lengths = None
+        self.offsets = None
+        self.emojiids = None
+
+    def loadartifacts(self):
+        """Load the emojis, the model and the emoji word vectors."""
+        emojis = self.loademojis()
+        wordcorpus = emojilib.emojicorpus(emojis)
+        if self.dimensions is None:
+            model = word2vec.normedmodel(wordcorpus)
+        else:
+            model = word2vec.reducedmodel(wordcorpus, self.dimensions)
+
+        corpusmap = emojilib.emojicorpusmap(emojis, model.vocab)
+        wcl = list(corpusmap.items())
+        names = list(emojis)
+        nameids = dict((name, i) for i, name in enumerate(names))
+
+        # Store the emojis of each corpus word as slices of one flat array
+        self.lengths = np.array([len(wordnames) for _, wordnames in wcl], dtype=np.intp)
+        self.offsets = np.concatenate(([0], np.cumsum(self.lengths)[:-1]))
+        self.emojiids = np.array([nameids[name] for _, wordnames in wcl for name in wordnames], dtype=np.intp)
+
+        self.corpus = word2vec.vectorcorpus(model, wcl)
+        self.model = model
+        self.names = names
+        self.emojis = emojis
+
+    @property
+    def size(self):
+        """The number of words in the emoji corpus."""
+        self.load()
+        return len(self.lengths)
+
+    def warmup(self, words=WARMUP_WORDS, num=NUM_EMOJIS):
+        """Fault in the mapped model and run queries for the words so later
+        queries don't pay for loading pages from disk.
+        """
+        self.load()
+        print('Prefaulting vectors')
+        word2vec.prefault(self.model.syn0)
+        word2vec.prefault(self.corpus)
+
+        print('Running warm-up queries')
+        self.batchquery(words, num)
+
+    def query(self, word, num):
+        checknum(num)
+        self.load()
+        dotprod = np.dot(self.corpus, self.model.word_vec(word))
+        top = min(num, self.size)
+        matches = np.argpartition(dotprod, -top)[-top:]
+        return self.rank(dotprod, matches, num)
+
+    def batchquery(self, words, num):
+        checknum(num)
+        self.load()
+        ids = np.full((len(words), num), -1, dtype=np.intp)
+        scores = np.full((len(words), num), np.nan, dtype=self.corpus.dtype)
+
+        rows = [row for row, word in enumerate(words) if word in self.model.vocab]
+        if not rows:
+            return ids, scores
+
+        # Score every word against the corpus at once
+        vectors = np.array([self.model.word_vec(words[row]) for row in rows])
+        dotprods = np.dot(vectors, self.corpus.T)
+        top = min(num, self.size)
+        allmatches = np.argpartition(dotprods, -top, axis=1)[:, -top:]
+
+        for row, dotprod, matches in zip(rows, dotprods, allmatches):
+            wordids, wordscores = self.rank(dotprod, matches, num)
+            ids[row, :len(wordids)] = wordids
+            scores[row, :len(wordids)] = wordscores
+        return ids, scores
+
+    def rank(self, dotprod, matches, num):
+        """Return the ids and similarities of up to num emojis for the best
+        matching corpus words.
+
+        Emojis of words that aren't in large categories come first, most
+        similar first. If there are fewer than `NUM_EMOJIS` of them, they're
+        followed by the emojis of large categories, smallest category first.
+        """
+        matches = matches[np.argsort(dotprod[matches])[::-1]]
+        small = self.lengths[matches] < CATEGORY_LENGTH
+        ids, scores = self.expand(dotprod, matches[small])
+        if len(ids) >= NUM_EMOJIS:
+            return ids[:num], scores[:num]
+
+        categories = matches[~small]
+        categories = categories[np.argsort(self.lengths[categories], kind='stable')]
+        ids, scores = self.expand(dotprod, np.concatenate((matches[small], categories)))
+        return ids[:num], scores[:num]
+
+    def expand(self, dotprod, order):
+        """Return the ids and similarities of the emojis the corpus words map
+        to, in order and keeping only the first occurence of each emoji.
+        """
+        lengths = self.lengths[order]
+        ends = np.cumsum(lengths)
+        positions = np.arange(lengths.sum()) + np.repeat(self.offsets[order] - ends + lengths, lengths)
+        ids = self.emojiids[positions]
+        scores = np.repeat(dotprod[order], lengths)
+
+        _, first = np.unique(ids, return_index=True)
+        first = np.sort(first)
+        return ids[first], scores[first]
+
+class SimilarListEngine(Engine):
+    """Suggests emojis from lists of the words most similar to each emoji name
+    and keyword.
+    """
+
+    def __init__(self, loademojis=emojilib.emojis):
+        super().__init__(loademojis)
+        self.matches = None
+
+    def loadartifacts(self):
+        """Load the emojis and turn the reverse map into arrays."""
+        emojis = self.loademojis()
+        wordcorpus = emojilib.emojicorpus(emojis)
+        corpusmap = emojilib.emojicorpusmap(emojis, wordcorpus)
+        reverse = similarlist.reverse(wordcorpus, corpusmap)
+
+        names = list(emojis)
+        nameids = dict((name, i) for i, name in enumerate(names))
+
+        # Sort each word's emojis by similarity and keep the first of each
+        self.matches = {}
+        for word, wordmatches in reverse.items():
+            ids = np.array([nameids[name] for name, _ in wordmatches], dtype=np.intp)
+            scores = np.array([score for _, score in wordmatches], dtype=np.float32)
+            order = np.argsort(-scores, kind='stable')
+            _, first = np.unique(ids[order], return_index=True)
+            keep = order[np.sort(first)]
+            self.matches[word] = (ids[keep], scores[keep])
+
+        self.names = names
+        self.emojis = emojis
+
+    def query(self, word, num):
+        checknum(num)
+        self.load()
+        ids, scores = self.matches[word]
+        return ids[:num], scores[:num]
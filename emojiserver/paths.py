@@ -14,9 +14,13 @@ def file(filename):
 BIN_NAME = file('GoogleNews-vectors-negative300.bin')
 SAVE_NAME = file('vectors.bin')
 NSAVE_NAME = file('normedvectors.bin')
+RSAVE_NAME = file('reducedvectors{}.bin') # Formatted with the dimension count
 
 DP_NAME = file('dp.npy')
 
+SIMILARS_NAME = file('similars.pickle')
+REVERSE_NAME = file('reverse.pickle')
+
 EMOJI_NAME = file('emojis.json')
 SLACKEMOJIS_NAME = file('slackemojis.json')
 PAREDEMOJIS_NAME = file('paredemojis.json')
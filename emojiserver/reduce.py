@@ -0,0 +1,55 @@
+"""
+This program builds the dimensionality reduced model and reports how much
+memory and time it saves compared to the full model.
+"""
+
+import argparse
+import time
+
+import word2vec
+from engine import NUM_EMOJIS, WARMUP_WORDS, EmojiEngine
+
+DIMENSIONS = 128 # Dimensions to reduce the model to
+REPEATS = 100 # Times to run each sample query when timing
+
+def measure(engine):
+    """Return the bytes used by the engine's vectors and the seconds taken per
+    query, along with the ids of the emojis suggested for the sample words.
+    """
+    engine.warmup()
+    nbytes = engine.model.syn0.nbytes + engine.corpus.nbytes
+
+    words = [w for w in WARMUP_WORDS if w in engine.model.vocab]
+    results = dict((w, engine.query(w, NUM_EMOJIS)[0]) for w in words)
+
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        for word in words:
+            engine.query(word, NUM_EMOJIS)
+    elapsed = (time.perf_counter() - start) / (REPEATS * len(words))
+
+    return nbytes, elapsed, results
+
+def overlap(full, reduced):
+    """Return the average fraction of emojis both models suggest for a word."""
+    fractions = []
+    for word in full:
+        common = len(set(full[word]) & set(reduced[word]))
+        fractions.append(common / max(1, len(full[word])))
+    return sum(fractions) / max(1, len(fractions))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--dimensions', type=int, default=DIMENSIONS)
+    args = parser.parse_args()
+    try:
+        word2vec.checkdimensions(args.dimensions)
+    except ValueError as e:
+        parser.error(str(e))
+
+    fullbytes, fulltime, fullresults = measure(EmojiEngine())
+    reducedbytes, reducedtime, reducedresults = measure(EmojiEngine(args.dimensions))
+
+    print('Vectors: {:.1f} MB -> {:.1f} MB'.format(fullbytes / 1e6, reducedbytes / 1e6))
+    print('Query time: {:.3f} ms -> {:.3f} ms'.format(fulltime * 1e3, reducedtime * 1e3))
+    print('Suggestions in common: {:.0%}'.format(overlap(fullresults, reducedresults)))
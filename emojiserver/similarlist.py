@@ -0,0 +1,79 @@
+"""
+This module gives access to the similar word lists used by the similarity list
+method, which maps each word close to an emoji word back to its emojis.
+"""
+
+import os.path
+import pickle
+
+from paths import BIN_NAME, SIMILARS_NAME, REVERSE_NAME
+
+SIMILAR_N = 100 # Number of similar words to find for each emoji word
+
+def generate_similars(wordcorpus):
+    """Generate the most similar words for each word in the corpus."""
+    from gensim.models.keyedvectors import KeyedVectors
+
+    print('Loading model')
+    model = KeyedVectors.load_word2vec_format(BIN_NAME, binary=True)
+    print('Model loaded!')
+
+    similars = {}
+    for word in wordcorpus:
+        print('\t' + word)
+        try:
+            similars[word] = model.similar_by_word(word, topn=SIMILAR_N)
+        except KeyError:
+            print('\twarning: ' + word + ' not in corpus')
+    print('Generated similar words')
+
+    with open(SIMILARS_NAME, 'wb') as f:
+        pickle.dump(similars, f)
+    print('Saved similar words')
+
+def generate_reverse(corpusmap):
+    """Generate the map of words to the emojis of the words they're similar to.
+
+    The similar words will need to have been generated, so
+    `generate_similars()` may need to be called before this function.
+    """
+    with open(SIMILARS_NAME, 'rb') as f:
+        similars = pickle.load(f)
+
+    reverse = {}
+    for word in similars:
+        # Add the word itself has emojis add them
+        if word in corpusmap:
+            for emoji in corpusmap[word]:
+                if not word in reverse:
+                    reverse[word] = []
+                reverse[word].append((emoji, 1.0))
+
+        # Then do similar words
+        for sim, val in similars[word]:
+            if sim in corpusmap:
+                for emoji in corpusmap[sim]:
+                    if not word in reverse:
+                        reverse[word] = []
+                    reverse[word].append((emoji, val))
+    print('Generated reverse')
+
+    with open(REVERSE_NAME, 'wb') as f:
+        pickle.dump(reverse, f)
+    print('Saved reversed')
+
+def reverse(wordcorpus, corpusmap):
+    """Return the map of words to the emojis and similarities they match.
+
+    The function takes in a set of all emoji words and a map of those words to
+    their emojis.
+    """
+    if not os.path.isfile(REVERSE_NAME):
+        if not os.path.isfile(SIMILARS_NAME):
+            generate_similars(wordcorpus)
+        generate_reverse(corpusmap)
+
+    with open(REVERSE_NAME, 'rb') as f:
+        reversemap = pickle.load(f)
+
+    return reversemap
@@ -0,0 +1,146 @@
+"""
+This module checks the array based ranking of the engines against the loops
+they replaced, using small random corpora instead of the word2vec model.
+"""
+
+import random
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+import numpy as np
+
+import emojilib
+from engine import CATEGORY_LENGTH, NUM_EMOJIS, EmojiEngine, SimilarListEngine
+
+def loopsimilar(dotprod, wcl, num):
+    """Return the n matching emojis the way the server used to find them."""
+    matches = np.argpartition(dotprod, -num)[-num:]
+    sortedmatches = matches[np.argsort(dotprod[matches])][::-1]
+
+    goodnames = []
+    goodcategories = []
+    nameset = set()
+    for index in sortedmatches:
+        names = wcl[index][1]
+        if len(names) < CATEGORY_LENGTH:
+            for name in names:
+                if name not in nameset:
+                    goodnames.append((name, float(dotprod[index])))
+                    nameset.add(name)
+        else:
+            goodcategories.append((names, dotprod[index]))
+
+    if len(goodnames) < NUM_EMOJIS:
+        goodcategories.sort(key=lambda x: len(x[0]))
+        for category, similarity in goodcategories:
+            for name in category:
+                if name not in nameset:
+                    goodnames.append((name, float(similarity)))
+                    nameset.add(name)
+                    if len(goodnames) == num:
+                        break
+            if len(goodnames) == num:
+                break
+
+    return goodnames[:num]
+
+def looplookup(reverse, word, num):
+    """Return the n matching emojis the way bysimilarlist.py used to find them."""
+    matches = sorted(reverse[word], key=lambda x: x[1], reverse=True)
+    found = []
+    matchset = set()
+    for m in matches:
+        if m[0] not in matchset:
+            found.append(m)
+            matchset.add(m[0])
+            if len(found) == num:
+                break
+    return found
+
+def randomemojis(rand):
+    """Return an emojilib style dict where each keyword belongs to a random
+    number of emojis.
+    """
+    emojis = dict(('emoji{}'.format(i), {'keywords': []}) for i in range(40))
+    sizes = [1, 1, 2, 3, CATEGORY_LENGTH, CATEGORY_LENGTH + 1, 12]
+    for i in range(60):
+        for name in rand.sample(sorted(emojis), rand.choice(sizes)):
+            emojis[name]['keywords'].append('word{}'.format(i))
+    return emojis
+
+def randomvector(rand):
+    """Return a random word vector."""
+    return np.array([rand.gauss(0, 1) for _ in range(5)], dtype=np.float32)
+
+def randomengine(rand):
+    """Return a loaded engine over a random corpus, along with the corpus."""
+    emojis = randomemojis(rand)
+    vocab = dict(('word{}'.format(i), randomvector(rand)) for i in range(60))
+    vocab.update(('query{}'.format(i), randomvector(rand)) for i in range(3))
+    model = SimpleNamespace(vocab=vocab, word_vec=lambda word: vocab[word])
+
+    engine = EmojiEngine(loademojis=lambda: emojis)
+    with mock.patch('word2vec.normedmodel', return_value=model):
+        engine.load()
+    wcl = list(emojilib.emojicorpusmap(emojis, vocab).items())
+    return engine, wcl
+
+class EmojiEngineTest(unittest.TestCase):
+
+    def test_query_matches_loop(self):
+        rand = random.Random(0)
+        for _ in range(200):
+            engine, wcl = randomengine(rand)
+            corpus = np.array([engine.model.word_vec(word) for word, _ in wcl])
+            dotprod = np.dot(corpus, engine.model.word_vec('query0'))
+            for num in (1, 5, NUM_EMOJIS, 20, 60):
+                ids, scores = engine.query('query0', num)
+                got = [(engine.names[i], float(s)) for i, s in zip(ids, scores)]
+                self.assertEqual(got, loopsimilar(dotprod, wcl, num))
+
+    def test_batchquery_matches_query(self):
+        engine, _ = randomengine(random.Random(1))
+        ids, scores = engine.batchquery(['query0', 'missing', 'query1'], 20)
+        self.assertEqual(ids.shape, (3, 20))
+        self.assertTrue((ids[1] == -1).all())
+        self.assertTrue(np.isnan(scores[1]).all())
+        for row, word in ((0, 'query0'), (2, 'query1')):
+            wordids, wordscores = engine.query(word, 20)
+            np.testing.assert_array_equal(ids[row, :len(wordids)], wordids)
+            np.testing.assert_array_equal(scores[row, :len(wordids)], wordscores)
+            self.assertTrue((ids[row, len(wordids):] == -1).all())
+
+    def test_rejects_num_below_one(self):
+        engine, _ = randomengine(random.Random(2))
+        for num in (0, -3):
+            with self.assertRaises(ValueError):
+                engine.query('query0', num)
+            with self.assertRaises(ValueError):
+                engine.batchquery(['query0'], num)
+
+class SimilarListEngineTest(unittest.TestCase):
+
+    def test_query_matches_loop(self):
+        rand = random.Random(3)
+        emojis = randomemojis(rand)
+        names = sorted(emojis)
+        # Few distinct scores so ties have to keep their original order
+        similarities = [0.25, 0.5, 0.75, 1.0]
+        reverse = {}
+        for i in range(60):
+            reverse['word{}'.format(i)] = [(rand.choice(names), rand.choice(similarities))
+                                           for _ in range(rand.randint(1, 30))]
+
+        engine = SimilarListEngine(loademojis=lambda: emojis)
+        with mock.patch('similarlist.reverse', return_value=reverse):
+            engine.load()
+
+        for word in reverse:
+            for num in (1, 5, 10, 40):
+                ids, scores = engine.query(word, num)
+                got = [(engine.names[i], float(s)) for i, s in zip(ids, scores)]
+                self.assertEqual(got, looplookup(reverse, word, num))
+
+if __name__ == '__main__':
+    unittest.main()
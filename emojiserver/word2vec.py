@@ -4,16 +4,18 @@ similar to the emojis in emojilib.
 """
 
 import gc
+import mmap
 import os
 
 import numpy as np
 from gensim import matutils
 from gensim.models.keyedvectors import KeyedVectors
 
-from paths import BIN_NAME, DP_NAME, SAVE_NAME, NSAVE_NAME
+from paths import BIN_NAME, DP_NAME, SAVE_NAME, NSAVE_NAME, RSAVE_NAME
 
 MAX_DEGREE = 0.5 # Not really a degree; just a number from 0 to 1 representing similarity
 CHUNKSIZE = 1000 # For splitting up memmaps
+VECTOR_SIZE = 300 # Dimensions of the vectors in the GoogleNews model
 
 def generate_dps(wordcorpus):
     """Generate the maximum similarity of each word to emoji names.
@@ -112,8 +114,55 @@ def generate_normedmodel():
     print('Saving model')
     model.save(NSAVE_NAME)
 
-def normedmodel(corpus):
-    """Return the limitted word2vec model.
+def checkdimensions(dimensions):
+    """Raise a ValueError if the model can't be reduced to the dimensions.
+
+    None is allowed and means the model isn't reduced.
+    """
+    if dimensions is not None and not 0 < dimensions < VECTOR_SIZE:
+        raise ValueError('--dimensions must be between 1 and {}'.format(VECTOR_SIZE - 1))
+
+def generate_reducedmodel(dimensions):
+    """Generate a normed word2vec model projected down to fewer dimensions.
+
+    The projection is found with PCA over the normed model's vectors, and the
+    projected vectors are normed again so dot products remain similarities.
+    """
+    checkdimensions(dimensions)
+
+    print('Loading model')
+    model = KeyedVectors.load(NSAVE_NAME, mmap='r')
+    print('Model loaded!')
+
+    vectors = model.syn0
+
+    print('Computing covariance')
+    mean = np.mean(vectors, axis=0, dtype=np.float64)
+    covariance = np.zeros((vectors.shape[1], vectors.shape[1]))
+    for c in range(0, vectors.shape[0], CHUNKSIZE):
+        chunk = vectors[c:c+CHUNKSIZE] - mean
+        covariance += np.dot(chunk.T, chunk)
+
+    # Keep the eigenvectors with the largest eigenvalues
+    print('Fitting projection')
+    _, eigenvectors = np.linalg.eigh(covariance)
+    components = eigenvectors[:, ::-1][:, :dimensions]
+
+    print('Projecting vectors')
+    reduced = np.empty((vectors.shape[0], dimensions), dtype=vectors.dtype)
+    for c in range(0, vectors.shape[0], CHUNKSIZE):
+        reduced[c:c+CHUNKSIZE] = np.dot(vectors[c:c+CHUNKSIZE] - mean, components)
+    reduced /= np.linalg.norm(reduced, axis=1)[:, np.newaxis]
+
+    model.syn0 = reduced
+    model.syn0norm = None
+
+    print('Saving model')
+    model.save(RSAVE_NAME.format(dimensions))
+
+def prepare_normedmodel(corpus):
+    """Generate the normed model and the files it's made from if they don't
+    exist yet.
 
     The function takes in a corpus which is a set of all emoji words.
     """
@@ -124,6 +173,13 @@ def normedmodel(corpus):
             generate_limittedmodel()
         generate_normedmodel()
 
+def normedmodel(corpus):
+    """Return the limitted word2vec model.
+
+    The function takes in a corpus which is a set of all emoji words.
+    """
+    prepare_normedmodel(corpus)
+
     # Load the reduced word2vec model
     print('Loading model')
     model = KeyedVectors.load(NSAVE_NAME, mmap='r')
@@ -131,6 +187,21 @@ def normedmodel(corpus):
 
     return model
 
+def reducedmodel(corpus, dimensions):
+    """Return the limitted word2vec model reduced to the given dimensions.
+
+    The function takes in a corpus which is a set of all emoji words.
+    """
+    if not os.path.isfile(RSAVE_NAME.format(dimensions)):
+        prepare_normedmodel(corpus)
+        generate_reducedmodel(dimensions)
+
+    print('Loading reduced model')
+    model = KeyedVectors.load(RSAVE_NAME.format(dimensions), mmap='r')
+    print('Model loaded!')
+
+    return model
+
 def vectorcorpus(model, wcl):
     """Return an array of word vectors for the dict of words.
 
@@ -139,3 +210,19 @@ def vectorcorpus(model, wcl):
     corpus = np.array([model.word_vec(word) for word, _ in wcl])
     print('Created corpus with {} elements'.format(len(corpus)))
     return corpus
+
+def prefault(array):
+    """Read through an array so its pages are resident in memory.
+
+    Memory mapped arrays are also advised to the kernel as needed soon, which
+    lets it read ahead of the sequential pass.
+    """
+    mapping = getattr(array, '_mmap', None)
+    if mapping is not None and hasattr(mapping, 'madvise'):
+        mapping.madvise(mmap.MADV_WILLNEED)
+
+    # Touching one element per page is enough to fault it in
+    step = max(1, mmap.PAGESIZE // array.itemsize)
+    flat = array.reshape(-1)
+    for c in range(0, flat.shape[0], CHUNKSIZE*step):
+        flat[c:c+CHUNKSIZE*step:step].sum()